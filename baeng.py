@@ -2,11 +2,18 @@
 
 import sys
 import json
-from typing import Literal
+import ast
+import builtins
+import types
+from typing import Any, Callable, Literal
 import numpy as np
 import wave
 from baengParser import translate
 
+# number of samples evaluated at once by vectorized user_functions,
+# small enough for the temporary float64 arrays of an expression to stay in the L2 cache
+VECTOR_BLOCK_SIZE = 8192
+
 
 class ImpulseResponse:
     """
@@ -29,7 +36,8 @@ class ImpulseResponse:
             Duration of the impulse response at the given sample frequency, measured in seconds
         """
 
-        self.data = np.zeros(int(fs * duration), dtype=np.float32)
+        self.n_samples = int(fs * duration)
+        self.data = np.zeros(self.n_samples, dtype=np.float32)
         self.fs = fs
         self.duration = duration
 
@@ -52,7 +60,7 @@ class ImpulseResponse:
             # round subsamples to nearest sample
             index = int(round(index))
 
-        if index < len(self.data):
+        if index < self.n_samples:
             # only write if index withing range of IR
             # else ignore
             return self.data[index]
@@ -75,11 +83,40 @@ class ImpulseResponse:
             # round subsamples to nearest sample
             index = int(round(index))
 
-        if index < len(self.data):
+        if index < self.n_samples:
             # only write if index withing range of IR
             # else ignore
             self.data[index] = value
 
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        """
+        Let numpy functions use the sample values directly, e.g. np.max(IR) in expressions.
+
+        Parameters
+        ----------
+        dtype : np.dtype, optional
+            Requested data type of the array
+        copy : bool | None, optional
+            True to always return a copy, None to copy only if needed,
+            False to never copy (raising a ValueError if the dtype has to be converted)
+
+        Returns
+        -------
+        out : (N, ) np.ndarray
+            Sample values of the impulse response
+        """
+
+        if dtype is None:
+            dtype = self.data.dtype
+
+        if copy:
+            return self.data.astype(dtype)
+
+        if copy is False and np.dtype(dtype) != self.data.dtype:
+            raise ValueError(f"unable to convert the samples to {np.dtype(dtype)} without a copy")
+
+        return self.data.astype(dtype, copy=False)
+
     def to_numpy(self) -> np.ndarray:
         """
         Export the impulse response as a numpy ndarray, containing all sample values.
@@ -102,22 +139,26 @@ class ImpulseResponse:
             Output file path
         """
 
+        # single float64 working copy, all further steps are done in place
         data = self.data.astype(np.float64)
 
         # Remove NaN / Inf explicitly
-        data = np.nan_to_num(
+        np.nan_to_num(
             data,
+            copy=False,
             nan=0.0,
             posinf=0.0,
             neginf=0.0
         )
 
-        peak = np.max(np.abs(data))
+        # peak of the absolute values, without a temporary array of them
+        peak = max(data.max(), -data.min())
 
         if peak > 0:
-            data = data / peak
+            np.divide(data, peak, out=data)
 
-        pcm16 = (data * 32767).astype(np.int16)
+        np.multiply(data, 32767, out=data)
+        pcm16 = data.astype(np.int16)
 
         with wave.open(path, "wb") as w:
             # 1 channel - mono
@@ -125,7 +166,276 @@ class ImpulseResponse:
             # 2 bytes per sample
             w.setsampwidth(2)
             w.setframerate(self.fs)
-            w.writeframes(pcm16.tobytes())
+            # write the buffer of the array directly, without a copy to bytes
+            w.writeframes(memoryview(pcm16).cast("B"))
+
+
+# builtins without side effects, allowed in expressions evaluated once per function call
+PURE_BUILTINS = {"abs", "int", "float", "round", "min", "max", "pow"}
+
+
+# type codes of numpy integer types, results of ufunc loops on integers would wrap around
+INTEGER_TYPECODES = set(np.typecodes["AllInteger"])
+
+
+def _float_expression(node: ast.AST) -> bool:
+    """
+    Check if an expression node certainly evaluates to a float, even when all variables are integers.
+
+    Parameters
+    ----------
+    node : ast.AST
+        Node of a parsed expression
+
+    Returns
+    -------
+    out : bool
+        True if the value is a float for any numeric variables, False if it may be an integer
+    """
+
+    if isinstance(node, ast.Constant):
+        return type(node.value) is float
+
+    if isinstance(node, ast.Attribute):
+        # constants like np.pi
+        return isinstance(getattr(np, node.attr, None), float)
+
+    if isinstance(node, ast.BinOp):
+        if isinstance(node.op, ast.Div):
+            return True
+        return _float_expression(node.left) or _float_expression(node.right)
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        return _float_expression(node.operand)
+
+    if isinstance(node, ast.Call):
+        if isinstance(node.func, ast.Name):
+            # abs keeps the type of its argument
+            return bool(node.args) and _float_expression(node.args[0])
+
+        if not isinstance(node.func, ast.Attribute):
+            return False
+
+        ufunc = getattr(np, node.func.attr, None)
+        if not isinstance(ufunc, np.ufunc):
+            return False
+
+        if not _integer_ufunc(ufunc):
+            return True
+
+        return any(_float_expression(arg) for arg in node.args)
+
+    return False
+
+
+def _integer_ufunc(ufunc: np.ufunc) -> bool:
+    """
+    Check if a numpy ufunc has loops computing integer results, e.g. np.power or np.add.
+
+    Parameters
+    ----------
+    ufunc : np.ufunc
+        numpy ufunc to check
+
+    Returns
+    -------
+    out : bool
+        True if the ufunc returns integers for integer arguments, False if it always computes floats
+    """
+
+    return any(
+        not INTEGER_TYPECODES.isdisjoint(loop.split("->")[1])
+        for loop in ufunc.types
+    )
+
+
+def _pure_names(expression: str, elementwise: bool = False) -> set | None:
+    """
+    Check if an expression is pure, so its value only depends on the variables it uses.
+
+    Accepted are arithmetic, comparisons, numpy ufuncs, constants like np.pi
+    and the builtins in PURE_BUILTINS.
+    Anything else (e.g. np.random, IR, other functions) is rejected.
+
+    With elementwise=True the expression additionally has to give the same result when
+    evaluated for all samples at once, with SAMPLEPOS being an array of all sample
+    positions instead of a single one. Then only abs is accepted as builtin and
+    conditional expressions, boolean operators and chained comparisons are rejected.
+    Comparisons are only accepted as the whole expression, as arithmetic on arrays of bools
+    differs from arithmetic on Python bools (e.g. True + True), and identity and membership
+    tests are rejected. numpy ufuncs with integer loops (e.g. np.power) need a float argument,
+    as SAMPLEPOS is an array of floats, while integer arguments would wrap around in the sample loop.
+    For the same reason **, % and // need a float operand, as they are exact on Python ints
+    in the sample loop, but lose precision on large floats.
+
+    Parameters
+    ----------
+    expression : str
+        Python expression as used by _eval_string
+    elementwise : bool, optional
+        Check if the expression can be evaluated elementwise (default: False)
+
+    Returns
+    -------
+    out : set | None
+        Names of the variables and builtins the expression depends on (besides np),
+        or None if the expression is not pure
+    """
+
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError:
+        return None
+
+    allowed_builtins = {"abs"} if elementwise else PURE_BUILTINS
+    names = set()
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute):
+            # only plain numpy attributes like np.sin or np.pi
+            if not (isinstance(node.value, ast.Name) and node.value.id == "np"):
+                return None
+
+            attribute = getattr(np, node.attr, None)
+            if not (isinstance(attribute, (np.ufunc, float))):
+                return None
+
+        elif isinstance(node, ast.Call):
+            # only calls of builtins or numpy ufuncs with positional arguments
+            if node.keywords or any(isinstance(arg, ast.Starred) for arg in node.args):
+                return None
+
+            if isinstance(node.func, ast.Name):
+                if node.func.id not in allowed_builtins:
+                    return None
+            elif not (
+                isinstance(node.func, ast.Attribute)
+                and isinstance(getattr(np, node.func.attr, None), np.ufunc)
+            ):
+                return None
+            elif (
+                elementwise
+                and _integer_ufunc(getattr(np, node.func.attr))
+                and not any(_float_expression(arg) for arg in node.args)
+            ):
+                # integer arguments would use the integer loop in the sample loop
+                return None
+
+        elif isinstance(node, ast.Name):
+            if node.id == "IR":
+                # the impulse response changes while iterating over the samples
+                return None
+            if node.id != "np":
+                names.add(node.id)
+
+        elif isinstance(node, ast.Compare):
+            # chained comparisons are not elementwise
+            if elementwise and len(node.ops) > 1:
+                return None
+
+            # arrays of bools only give the same values as the whole expression
+            if elementwise and node is not tree.body:
+                return None
+
+        elif isinstance(node, ast.Constant):
+            if type(node.value) not in [int, float, bool]:
+                return None
+
+        elif isinstance(node, (ast.IfExp, ast.BoolOp, ast.boolop)):
+            # conditional expressions and boolean operators are not elementwise
+            if elementwise:
+                return None
+
+        elif isinstance(node, ast.BinOp):
+            # e.g. SAMPLEPOS ** 3 % m exceeds 2**53, where floats are no longer exact
+            if (
+                elementwise
+                and isinstance(node.op, (ast.Pow, ast.Mod, ast.FloorDiv))
+                and not _float_expression(node)
+            ):
+                return None
+
+        elif isinstance(node, (ast.Is, ast.IsNot, ast.In, ast.NotIn)):
+            # identity and membership tests compare the whole array at once
+            if elementwise:
+                return None
+
+        elif not isinstance(
+            node,
+            (ast.Expression, ast.BinOp, ast.UnaryOp, ast.operator, ast.unaryop, ast.cmpop, ast.Load)
+        ):
+            return None
+
+    return names
+
+
+def _assigned_names(code_block: list) -> set:
+    """
+    Collect the names of all variables defined in a code block, including nested blocks.
+
+    Parameters
+    ----------
+    code_block : list
+        A list compatible with BAENG code, containing code lines
+
+    Returns
+    -------
+    out : set
+        Names of the variables defined in the code block
+    """
+
+    names = set()
+
+    for code_line in code_block:
+        if type(code_line) is not list or len(code_line) < 3:
+            # incomplete code lines only raise an error when they are executed
+            continue
+
+        if code_line[0] == "define" and type(code_line[1]) is str:
+            names.add(code_line[1])
+
+        elif code_line[0] in ["if", "while"] and type(code_line[2]) is list:
+            names.update(_assigned_names(code_line[2]))
+
+    return names
+
+
+# expressions containing these nodes or names depend on the namespace being the
+# local scope of eval, so they are not translated to functions by _compile_expression
+EVAL_ONLY_NODES = (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp, ast.NamedExpr)
+EVAL_ONLY_NAMES = {"locals", "vars", "dir", "globals", "eval", "exec"}
+
+
+class _NamespaceLookup(ast.NodeTransformer):
+    """
+    Replaces every variable x of an expression by _ns["x"],
+    names of builtins by _ns["x"] if "x" in _ns else _b["x"]
+    """
+
+    def visit_Name(self, node):
+        lookup = ast.Subscript(
+            value=ast.Name(id="_ns", ctx=ast.Load()),
+            slice=ast.Constant(value=node.id),
+            ctx=ast.Load(),
+        )
+
+        if node.id not in vars(builtins):
+            return lookup
+
+        # variables shadow builtins, like in eval
+        return ast.IfExp(
+            test=ast.Compare(
+                left=ast.Constant(value=node.id),
+                ops=[ast.In()],
+                comparators=[ast.Name(id="_ns", ctx=ast.Load())],
+            ),
+            body=lookup,
+            orelse=ast.Subscript(
+                value=ast.Name(id="_b", ctx=ast.Load()),
+                slice=ast.Constant(value=node.id),
+                ctx=ast.Load(),
+            ),
+        )
 
 
 class Baeng:
@@ -152,7 +462,14 @@ class Baeng:
         # init Impulse Response
         self.IR = ImpulseResponse(self.script["IR"][0], self.script["IR"][1])
         self.SAMPLEPOS = 0
-        # self.possible_sample_positions = cycle(list(range(0, self.IR.fs * self.IR.duration - 1)))
+
+        # namespace of _eval_string, kept up to date instead of assembled for every expression
+        self._namespace = dict()
+        self._update_namespace()
+
+        # globals of eval, only providing the builtins
+        # shared by all expressions instead of passing a new dict to every eval
+        self._eval_globals = {"__builtins__": builtins}
 
         # reading user_functions
         self.user_functions = script.copy()
@@ -160,7 +477,7 @@ class Baeng:
         self.user_functions.pop("CODE")
 
         # TODO: make constant attribute -> failed...
-        # dict for mapping baeng code to operators
+        # dict for mapping baeng code to the compilation of operators
         self.operators = {
             "if": self._if_op,
             "while": self._while_op,
@@ -171,54 +488,119 @@ class Baeng:
             "print": self._print_op
         }
 
+        # code objects and generated functions of all expressions in the script
+        self._code_cache = dict()
+        self._expression_cache = dict()
+
+        # compile the script once before running it
+        self.compiled_functions = dict()
+        self.vectorized_functions = dict()
+
+        # values of loop-invariant definitions of the running function call
+        self._hoisted_values = dict()
+        self._invariant_names = set()
+
+        for function_name, function in self.user_functions.items():
+            try:
+                # parameters and builtins which are not changed in the body
+                # keep their value for all samples of a function call
+                self._invariant_names = (
+                    set(function["PARAMS"]) | PURE_BUILTINS
+                ) - _assigned_names(function["CODE"])
+
+                self.compiled_functions[function_name] = self._compile_codeblock(
+                    function["CODE"], scope="local"
+                )
+                self.vectorized_functions[function_name] = self._compile_vectorized_function(function)
+            except Exception as error:
+                # malformed entries (e.g. extra keys of the script) only raise when called
+                self.compiled_functions[function_name] = self._compile_error(error)
+                self.vectorized_functions[function_name] = None
+
+        self._invariant_names = set()
+
+        self.compiled_code = self._compile_codeblock(self.script["CODE"], scope="global")
+
     def _if_op(self, condition, code_block, scope):
         """
-        Evaluates the condition and executes the codeblock if True
+        Compiles a conditional, which evaluates the condition and executes the codeblock if True
 
         Parameters
         ----------
         condition : list | string | int | float
-            evaluated by bool(self._fetch_parameter)
+            compiled by self._compile and evaluated as bool
         code_block : list
             code to be executed if condition is True
         scope : Literal["global", "local", "stay_local"]
             current scope when calling "if"
+
+        Returns
+        -------
+        out : Callable[[], None]
+            Compiled "if" operator
         """
 
         if scope == "local":
             # when inside function, no deeper scope layer should be generated
             scope = "stay_local"
 
-        if self._fetch_parameter(condition, scope=scope):
-            # interpret code block if condition is True
-            self._interpret_codeblock(code_block, parameters={}, scope=scope)
+        hoisted_names = _pure_names(condition) if type(condition) is str else None
+        condition = self._compile(condition, scope=scope)
+        code_block = self._compile_codeblock(code_block, scope=scope)
+
+        if (
+            scope == "stay_local"
+            and hoisted_names is not None
+            and hoisted_names <= self._invariant_names
+        ):
+            # the condition only depends on unchanged parameters,
+            # so it is evaluated once per function call instead of once per sample
+            condition = self._hoist(condition, hoisted_names)
+
+        def if_op():
+            if condition():
+                # execute code block if condition is True
+                code_block()
+
+        return if_op
 
     def _while_op(self, condition, code_block, scope):
         """
-        Evaluates the condition and repeatedly executes the codeblock
+        Compiles a loop, which evaluates the condition and repeatedly executes the codeblock
         until the condition is False
 
         Parameters
         ----------
         condition : list | string | int | float
-            evaluated by bool(self._fetch_parameter)
+            compiled by self._compile and evaluated as bool
         code_block : list
             code to be executed while condition is True
         scope : Literal["global", "local", "stay_local"]
             current scope when calling "while"
+
+        Returns
+        -------
+        out : Callable[[], None]
+            Compiled "while" operator
         """
 
         if scope == "local":
             # when inside function, no deeper scope layer should be generated
             scope = "stay_local"
 
-        while self._fetch_parameter(condition, scope=scope):
-            # repeat the code block while condition is True
-            self._interpret_codeblock(code_block, parameters={}, scope=scope)
+        condition = self._compile(condition, scope=scope)
+        code_block = self._compile_codeblock(code_block, scope=scope)
+
+        def while_op():
+            while condition():
+                # repeat the code block while condition is True
+                code_block()
+
+        return while_op
 
     def _define_op(self, name, value, scope):
         """
-        Set new variables or change the value of existing variables
+        Compiles setting new variables or changing the value of existing variables
 
         Parameters
         ----------
@@ -226,87 +608,204 @@ class Baeng:
             unique name of the variable to be used in expressions
         value : Any
             new value written to the variable
+        scope : Literal["global", "local", "stay_local"]
+            current scope when calling "define"
+
+        Returns
+        -------
+        out : Callable[[], None]
+            Compiled "define" operator
         """
 
-        # evaluate expression to value
-        evaluated_value = self._fetch_parameter(value, scope=scope)
+        hoisted_names = _pure_names(value) if type(value) is str else None
+        value = self._compile(value, scope=scope)
+
+        if (
+            scope in ["local", "stay_local"]
+            and hoisted_names is not None
+            and hoisted_names <= self._invariant_names
+        ):
+            # the value only depends on unchanged parameters,
+            # so it is evaluated once per function call instead of once per sample
+            value = self._hoist(value, hoisted_names)
+
+        # np, SAMPLEPOS and IR overwrite variables in the namespace of expressions
+        namespace = dict() if name in ["np", "SAMPLEPOS", "IR"] else self._namespace
+
+        # the variable dicts are only changed in place, so they are bound once
+        global_vars = self.global_vars
+        local_variables = self.local_variables
 
         if scope in ["local", "stay_local"]:
             # scope inside function
-            if name in self.global_vars:
-                # scope inside function, but global variable is changed
-                self.global_vars[name] = evaluated_value
+            def define_op():
+                # evaluate expression to value
+                evaluated_value = value()
 
-            else:
-                # scope inside function, but local variable gets changed or created
-                self.local_variables[-1][name] = evaluated_value
+                if name in global_vars:
+                    # scope inside function, but global variable is changed
+                    global_vars[name] = evaluated_value
+
+                else:
+                    # scope inside function, but local variable gets changed or created
+                    local_variables[-1][name] = evaluated_value
+
+                namespace[name] = evaluated_value
 
         elif scope == "global":
-            # add variable to the global variables
-            self.global_vars[name] = evaluated_value
+            def define_op():
+                # add variable to the global variables
+                global_vars[name] = namespace[name] = value()
 
         else:
             raise NotImplementedError(f"unknown scope {scope}")
 
+        return define_op
+
+    def _hoist(self, value: Callable[[], Any], names: set) -> Callable[[], Any]:
+        """
+        Wrap a compiled expression, so its value is only evaluated the first time
+        during a function call and reused for all following samples.
+
+        Parameters
+        ----------
+        value : Callable[[], Any]
+            compiled pure expression, which only depends on the given names
+        names : set
+            names of the variables the expression depends on
+
+        Returns
+        -------
+        out : Callable[[], Any]
+            Compiled expression with cached value
+        """
+
+        global_vars = self.global_vars
+
+        def hoisted_value():
+            hoisted_values = self._hoisted_values
+
+            if value in hoisted_values:
+                return hoisted_values[value]
+
+            evaluated_value = value()
+
+            if global_vars.keys().isdisjoint(names):
+                # global variables overwrite the parameters and may change while iterating
+                hoisted_values[value] = evaluated_value
+
+            return evaluated_value
+
+        return hoisted_value
+
     def _set_sample_op(self, key, value, scope):
         """
-        Write a value to a specific sample of the impulse response
+        Compiles writing a value to a specific sample of the impulse response
 
         Parameters
         ----------
         key : list | string | int | float
-            sample index derived from evaluating key with self._fetch_parameter
+            sample index derived from evaluating key with self._compile
         value : float
             new value written at the index (key) of the impulse response
         scope : Literal["global", "local", "stay_local"]
             current scope when calling "setSample"
+
+        Returns
+        -------
+        out : Callable[[], None]
+            Compiled "setSample" operator
         """
 
-        # evaluate expression to get index
-        index = self._fetch_parameter(key, scope=scope)
+        key = self._compile(key, scope=scope)
+        value = self._compile(value, scope=scope)
+
+        # the samples are accessed directly, same as ImpulseResponse.__setitem__
+        data = self.IR.data
+        n_samples = self.IR.n_samples
+
+        def set_sample_op():
+            # evaluate expression to get index
+            index = key()
+
+            # evaluate expression to get value
+            sample_value = value()
 
-        # evaluate expression to get value and write it to the IR at the index
-        self.IR[index] = self._fetch_parameter(value, scope=scope)
+            if type(index) is float:
+                # round subsamples to nearest sample
+                index = int(round(index))
 
-    def _read_sample_op(self, key, scope) -> np.float32:
+            if index < n_samples:
+                # only write if index withing range of IR
+                # else ignore
+                data[index] = sample_value
+
+        return set_sample_op
+
+    def _read_sample_op(self, key, scope):
         """
-        Read the value of a specific sample of the impulse response
+        Compiles reading the value of a specific sample of the impulse response
 
         Parameters
         ----------
         key : list | string | int | float
-            sample index derived from evaluating key with self._fetch_parameter
+            sample index derived from evaluating key with self._compile
         scope : Literal["global", "local", "stay_local"]
             current scope when calling "readSample"
 
         Returns
         -------
-        out : np.float32
-            Sample value of the impulse response at the selected key
+        out : Callable[[], np.float32]
+            Compiled "readSample" operator, returning the sample value at the selected key
         """
 
-        # evaluate expression to get index
-        index = self._fetch_parameter(key, scope=scope)
+        key = self._compile(key, scope=scope)
+
+        # the samples are accessed directly, same as ImpulseResponse.__getitem__
+        data = self.IR.data
+        n_samples = self.IR.n_samples
 
-        # return sample value at selected index
-        value = self.IR[index]
-        return value
+        def read_sample_op():
+            # evaluate expression to get index
+            index = key()
+
+            if type(index) is float:
+                # round subsamples to nearest sample
+                index = int(round(index))
+
+            if index < n_samples:
+                # return sample value at selected index
+                return data[index]
+
+            return 0
+
+        return read_sample_op
 
     def _export_op(self, filepath, scope):
         """
-        Exports current IR to a given filename
+        Compiles exporting the current IR to a given filename
 
         Parameters
         ----------
         filepath: str
             The file path to store the IR to, ends with .wav
+        scope : Literal["global", "local", "stay_local"]
+            current scope when calling "export"
+
+        Returns
+        -------
+        out : Callable[[], None]
+            Compiled "export" operator
         """
 
-        self.IR.export_wav_16bit(filepath)
+        def export_op():
+            self.IR.export_wav_16bit(filepath)
+
+        return export_op
 
     def _print_op(self, obj, scope):
         """
-        Prints the given string to the console
+        Compiles printing the given object to the console
 
         Parameters
         ----------
@@ -314,10 +813,114 @@ class Baeng:
             The object containing a command (list, e.g. readSample), expression (string)
             or number to be printed
         scope : Literal["global", "local", "stay_local"]
-            current scope when calling "readSample"
+            current scope when calling "print"
+
+        Returns
+        -------
+        out : Callable[[], None]
+            Compiled "print" operator
         """
 
-        print(self._fetch_parameter(obj, scope=scope))
+        obj = self._compile(obj, scope=scope)
+
+        def print_op():
+            print(obj())
+
+        return print_op
+
+    def _compile_string(self, string: str) -> types.CodeType:
+        """
+        Compile a string to a python code object, which can be evaluated by _eval_string.
+        Code objects are cached, so every distinct expression is only compiled once.
+
+        Parameters
+        ----------
+        string : str
+            Expression to be compiled
+
+        Returns
+        -------
+        out : types.CodeType
+            The expression compiled in "eval" mode
+        """
+
+        code = self._code_cache.get(string)
+
+        if code is None:
+            code = compile(string, "<baeng>", "eval")
+            self._code_cache[string] = code
+
+        return code
+
+    def _compile_expression(self, string: str) -> Callable[[], Any]:
+        """
+        Generate a python function evaluating the given expression,
+        with the same result as _eval_string but without calling eval.
+        Every variable of the expression is looked up in the namespace of _eval_string.
+
+        Expressions with own scopes (lambdas, comprehensions, ...) are still evaluated by eval.
+        Generated functions are cached, so every distinct expression is only generated once.
+
+        Parameters
+        ----------
+        string : str
+            Expression to be compiled
+
+        Returns
+        -------
+        out : Callable[[], Any]
+            Function without arguments returning the value of the expression
+        """
+
+        function = self._expression_cache.get(string)
+
+        if function is not None:
+            return function
+
+        code = self._compile_string(string)
+        tree = ast.parse(string, mode="eval")
+
+        if any(
+            isinstance(node, EVAL_ONLY_NODES)
+            or (isinstance(node, ast.Name) and node.id in EVAL_ONLY_NAMES)
+            for node in ast.walk(tree)
+        ):
+            # evaluated directly, same as _eval_string without checking the type of code
+            eval_globals = self._eval_globals
+            namespace = self._namespace
+
+            def function():
+                # a copy, so assignment expressions do not define variables
+                return eval(code, eval_globals, namespace.copy())
+
+        else:
+            names = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+
+            # replace every variable x by _ns["x"], to read it from the namespace
+            expression = ast.unparse(_NamespaceLookup().visit(tree.body))
+
+            # a missing variable raises a NameError, same as in eval
+            source = (
+                "def expression():\n"
+                "    try:\n"
+                f"        return {expression}\n"
+                "    except KeyError as error:\n"
+                "        if error.args and error.args[0] in _names and error.args[0] not in _ns:\n"
+                "            raise NameError(f\"name '{error.args[0]}' is not defined\") from None\n"
+                "        raise\n"
+            )
+
+            function_namespace = {
+                "_ns": self._namespace,
+                "_names": names,
+                "_b": vars(builtins),
+                "__builtins__": builtins,
+            }
+            exec(compile(source, "<baeng>", "exec"), function_namespace)
+            function = function_namespace["expression"]
+
+        self._expression_cache[string] = function
+        return function
 
     def _eval_string(self, string):
         """
@@ -327,8 +930,9 @@ class Baeng:
 
         Parameters
         ----------
-        string : str
-            Expression to be evaluated, containing local and global variables
+        string : str | types.CodeType
+            Expression to be evaluated, containing local and global variables.
+            Either as source or as code object already compiled in "eval" mode.
 
         Returns
         -------
@@ -336,58 +940,109 @@ class Baeng:
             The value of the given expression
         """
 
+        if type(string) is str:
+            string = self._compile_string(string)
+
+        # return evaluated expression
+        out = eval(string, self._eval_globals, self._namespace.copy())
+        return out
+
+    def _update_namespace(self):
+        """
+        Rebuild the namespace used by _eval_string from the local variables of the
+        deepest scope and the global variables.
+        Has to be called whenever the deepest scope changes,
+        new values of single variables and SAMPLEPOS are written to the namespace directly.
+        """
+
+        namespace = self._namespace
+        namespace.clear()
+
         # assemble dict of local variables from the deepest scope and global variables
-        all_variables = self.local_variables[-1].copy()
-        all_variables.update(
+        namespace.update(self.local_variables[-1])
+        namespace.update(
             self.global_vars
         )  # global variables overwrite local duplicates
-        all_variables["np"] = np  # add numpy to namespace
+        namespace["np"] = np  # add numpy to namespace
 
         # TODO: add np random variable
         # add SAMPLEPOS and IR as variables
-        all_variables.update({"SAMPLEPOS": self.SAMPLEPOS, "IR": self.IR})
+        namespace.update({"SAMPLEPOS": self.SAMPLEPOS, "IR": self.IR})
 
-        # return evaluated expression
-        out = eval(string, {}, all_variables)
-        return out
-
-    def _fetch_parameter(self, obj, scope):
+    def _compile(self, obj, scope):
         """
-        Evaluate any object and return its value
+        Translate any object once into a callable returning its value.
+        The script is compiled before running, so type checks and operator lookups
+        are not repeated for every sample.
 
         Parameters
         ----------
         obj : list | string | int | float
             The object containing a command (list, e.g. readSample), expression (string)
-            or number to be interpreted.
+            or number to be compiled.
         scope : Literal["global", "local", "stay_local"]
-            current scope when fetching the parameter
+            scope the object gets executed in
 
         Returns
         -------
-        out : Any
-            The value of the given object
+        out : Callable[[], Any]
+            Function without arguments returning the value of the given object
         """
 
-        if type(obj) is list:
-            # LIST: execute the associated operator
-            return self.operators[obj[0]](*obj[1:], scope=scope)
+        try:
+            if type(obj) is list:
+                # LIST: compile the associated operator
+                if obj[0] in self.operators:
+                    return self.operators[obj[0]](*obj[1:], scope=scope)
 
-        elif type(obj) is str:
-            # STR: evaluate the string as a python expression
-            return self._eval_string(obj)
+                # LIST: compile the call of a user_function
+                if obj[0] in self.user_functions:
+                    return self._compile_function_call(obj, scope=scope)
 
-        elif type(obj) is int or type(obj) is float:
-            # INT | FLOAT: return the object directly
-            return obj
+                # unknown command
+                raise NotImplementedError(f"unknown command {obj[0]}")
 
-        else:
-            # unknown object type
-            raise TypeError
+            elif type(obj) is str:
+                # STR: compile the string as a python expression
+                return self._compile_expression(obj)
+
+            elif type(obj) is int or type(obj) is float:
+                # INT | FLOAT: return the object directly
+                return lambda: obj
+
+            else:
+                # unknown object type
+                raise TypeError
+
+        except Exception as error:
+            # code that is never executed (e.g. an uncalled function) must not stop the script,
+            # so errors are only raised when the code is executed
+            return self._compile_error(error)
+
+    def _compile_error(self, error: Exception) -> Callable[[], Any]:
+        """
+        Compile an error found while compiling, to be raised when the code is executed.
+
+        Parameters
+        ----------
+        error : Exception
+            Error raised while compiling the code
+
+        Returns
+        -------
+        out : Callable[[], Any]
+            Function raising the error
+        """
+
+        def raise_error():
+            raise error
 
-    def _evaluate_function_parameters(self, code_line: list, scope: str) -> dict:
+        return raise_error
+
+    def _compile_function_parameters(self, code_line: list, scope: str) -> Callable[[], dict]:
         """
-        Evaluate and pack the given parameters of a function call to a dictionary with specific values
+        Compile the given parameters of a function call,
+        to be evaluated and packed to a dictionary with specific values
 
         Parameters
         ----------
@@ -400,23 +1055,26 @@ class Baeng:
 
         Returns
         -------
-        out : dict
-            Packed dictionary with the parameters in the form of
+        out : Callable[[], dict]
+            Function returning the packed dictionary with the parameters in the form of
             {keyword: arguments, ...}
         """
 
         parameter_names = self.user_functions[code_line[0]]["PARAMS"]
 
-        # evaluate every given parameter of the function call
+        # compile every given parameter of the function call
         if type(code_line[1]) is list:
-            parameter_values = []
-            for parameter in code_line[1]:
-                parameter_values.append(
-                    self._fetch_parameter(parameter, scope=scope)
-                )
+            parameter_values = [
+                self._compile(parameter, scope=scope) for parameter in code_line[1]
+            ]
 
-            # pack parameter names and values to dict
-            return dict(zip(parameter_names, parameter_values))
+            def evaluate_parameters():
+                # pack parameter names and values to dict
+                return dict(zip(
+                    parameter_names, [parameter() for parameter in parameter_values]
+                ))
+
+            return evaluate_parameters
 
         # TODO: parser can't interpret keyword args
         elif type(code_line[1]) is dict:
@@ -427,8 +1085,8 @@ class Baeng:
                         f"{code_line[0]} missing required argument '{parameter_name}'"
                     )
 
-            # evaluate all parameters
-            evaluated_parameters = dict()
+            # compile all parameters
+            compiled_parameters = dict()
 
             for parameter_name, parameter_value in code_line[1].items():
                 # check if given parameter is expected
@@ -437,83 +1095,285 @@ class Baeng:
                         f"{code_line[0]} got an unexpected argument '{parameter_name}'"
                     )
 
-                # evaluate parameter
-                evaluated_parameters[parameter_name] = self._fetch_parameter(parameter_value, scope=scope)
+                compiled_parameters[parameter_name] = self._compile(parameter_value, scope=scope)
+
+            def evaluate_parameters():
+                # return parameters in already packed form
+                return {
+                    parameter_name: parameter()
+                    for parameter_name, parameter in compiled_parameters.items()
+                }
+
+            return evaluate_parameters
+
+        else:
+            raise TypeError(f"{code_line[0]} got invalid arguments {code_line[1]}")
+
+    def _compile_vectorized_function(self, function: dict) -> Callable[[dict], bool] | None:
+        """
+        Compile the body of a user_function to be executed for all samples at once.
+        This is only possible, if the body consists of setSample lines writing to SAMPLEPOS
+        and defines of local variables, with values depending on SAMPLEPOS, scalar variables
+        and the local variables defined before in the same sample only,
+        e.g. phase = SAMPLEPOS / fs; setSample(SAMPLEPOS, amp * np.sin(phase)).
 
-            # return parameters in already packed form
-            return evaluated_parameters
+        Parameters
+        ----------
+        function : dict
+            user_function in the form of {"PARAMS": [...], "CODE": [...]}
+
+        Returns
+        -------
+        out : Callable[[dict], bool] | None
+            Function executing the body for all samples with the given parameters,
+            returning False if the values can't be computed at once (e.g. non-scalar parameters).
+            None if the body can't be vectorized at all.
+        """
 
-    def _interpret_codeblock(
+        if not function["CODE"]:
+            return None
+
+        # (name of the defined variable or None for setSample, value)
+        code_lines = []
+        names = set()
+        defined_names = _assigned_names(function["CODE"])
+        defined_before = set()
+
+        for code_line in function["CODE"]:
+            # only setSample(SAMPLEPOS, value) and define(name, value)
+            if (
+                type(code_line) is list
+                and len(code_line) == 3
+                and code_line[0] == "setSample"
+                and type(code_line[1]) is str
+                and code_line[1].strip() == "SAMPLEPOS"
+            ):
+                name = None
+
+            elif (
+                type(code_line) is list
+                and len(code_line) == 3
+                and code_line[0] == "define"
+                and type(code_line[1]) is str
+                and code_line[1].isidentifier()
+                and code_line[1] not in ["np", "SAMPLEPOS", "IR"]
+            ):
+                name = code_line[1]
+
+            else:
+                return None
+
+            value = code_line[2]
+
+            if type(value) is int or type(value) is float:
+                code_lines.append((name, value))
+
+            elif type(value) is str:
+                value_names = _pure_names(value, elementwise=True)
+                if value_names is None:
+                    return None
+
+                if name is not None and isinstance(ast.parse(value, mode="eval").body, ast.Compare):
+                    # a variable holding an array of bools would not behave like the bool
+                    # of the sample loop in following expressions (e.g. True + True)
+                    return None
+
+                # a variable defined in the body has to be defined before it is read,
+                # otherwise it would hold the value of the previous sample
+                if (value_names & defined_names) - defined_before:
+                    return None
+
+                names.update(value_names - defined_names - {"SAMPLEPOS"})
+                code_lines.append((name, self._compile_string(value)))
+
+            else:
+                return None
+
+            if name is not None:
+                defined_before.add(name)
+
+        def vectorized_function(parameters):
+            # every variable has to be a scalar, to be the same for every sample
+            for name in names:
+                if name in self.global_vars:
+                    value = self.global_vars[name]
+                elif name in parameters:
+                    value = parameters[name]
+                elif name == "abs":
+                    continue
+                else:
+                    return False
+
+                if not isinstance(value, (int, float, np.number)):
+                    return False
+
+            # defines of global variables would be visible after the function call
+            if not defined_names.isdisjoint(self.global_vars):
+                return False
+
+            # evaluate the values block by block, with SAMPLEPOS containing the sample positions
+            # of the block, so the temporary arrays of the expressions stay small and in cache
+            sample_position = self.SAMPLEPOS
+            block_positions = np.arange(min(VECTOR_BLOCK_SIZE, self.IR.n_samples), dtype=np.float64)
+            self.local_variables.append(parameters)
+            self._update_namespace()
+
+            try:
+                for start in range(0, self.IR.n_samples, VECTOR_BLOCK_SIZE):
+                    stop = min(start + VECTOR_BLOCK_SIZE, self.IR.n_samples)
+
+                    if start > 0:
+                        # reuse the buffer of the sample positions for the next block
+                        block_positions += VECTOR_BLOCK_SIZE
+                    self.SAMPLEPOS = self._namespace["SAMPLEPOS"] = block_positions[:stop - start]
+                    samples = None
+
+                    for name, value in code_lines:
+                        try:
+                            # floating point errors are raised, to be handled by the sample loop
+                            with np.errstate(all="raise", under="ignore"):
+                                if type(value) is not int and type(value) is not float:
+                                    value = self._eval_string(value)
+
+                        except Exception:
+                            return False
+
+                        result = np.asarray(value)
+                        if result.shape not in [(), (stop - start,)] or result.dtype.kind not in "biuf":
+                            return False
+
+                        if name is None:
+                            # the last setSample of the body determines every sample
+                            samples = value
+                        else:
+                            self._namespace[name] = value
+
+                    if samples is not None:
+                        self.IR.data[start:stop] = samples
+
+            finally:
+                self.local_variables.pop(-1)
+                self.SAMPLEPOS = sample_position
+                self._update_namespace()
+
+            if self.IR.n_samples > 0:
+                # SAMPLEPOS is left at the last sample, like after the sample loop
+                self.SAMPLEPOS = self._namespace["SAMPLEPOS"] = self.IR.n_samples - 1
+
+            return True
+
+        return vectorized_function
+
+    def _compile_function_call(self, code_line: list, scope: str) -> Callable[[], None]:
+        """
+        Compile the call of a user_function, which executes the code of the function
+        once for every sample of the impulse response
+
+        Parameters
+        ----------
+        code_line : list
+            The code line that calls the function in the form of
+            [function_name, [positional arguments, ...]] or
+            [function_name, {keyword: arguments, ...}]
+        scope : Literal["global", "local", "stay_local"]
+            current scope when calling the function
+
+        Returns
+        -------
+        out : Callable[[], None]
+            Compiled function call
+        """
+
+        function_name = code_line[0]
+        evaluate_parameters = self._compile_function_parameters(code_line, scope=scope)
+
+        def function_call():
+            new_parameters = evaluate_parameters()
+
+            # function bodies are looked up on call, so functions may call each other
+            # independent of their order of definition
+            vectorized_function = self.vectorized_functions[function_name]
+            if vectorized_function is not None and vectorized_function(new_parameters):
+                # all samples were computed at once
+                return
+
+            code_block = self.compiled_functions[function_name]
+
+            # new cache for values of loop-invariant definitions in this function call
+            hoisted_values = self._hoisted_values
+            self._hoisted_values = dict()
+
+            # every sample shares the same parameters as local variables,
+            # so the local scope is only added once for the whole sample loop
+            self.local_variables.append(new_parameters)
+            self._update_namespace()
+            namespace = self._namespace
+
+            for sample_position in range(self.IR.n_samples):
+                # iterate over each sample
+
+                # safe current sample_position in attributes
+                self.SAMPLEPOS = namespace["SAMPLEPOS"] = sample_position
+
+                # execute user_function as code with given parameters as local variables
+                code_block()
+
+            # remove the added local scope from the local variables list
+            self.local_variables.pop(-1)
+            self._update_namespace()
+
+            self._hoisted_values = hoisted_values
+
+        return function_call
+
+    def _compile_codeblock(
         self,
         code_block: list,
-        parameters: dict,
         scope: Literal["global", "local", "stay_local"],
-    ):
+    ) -> Callable[[], None]:
         """
-        Execute a given code block line by line
+        Compile a given code block line by line
 
         Parameters
         ----------
         code_block : list
             A list compatible with BAENG code, containing code lines
-        parameters : dict
-            Parameters passed as local variables.
-            Used for function calls, else empty dict.
         scope : Literal["global", "local", "stay_local"]
-            Scope of the executed code block.
+            Scope of the compiled code block.
 
             - "global": new variables in the codeblock get added to global variables
-            - "local": the codeblock gets a new local scope.
-                New variables in the codeblock get added to the new local scope.
+            - "local": the codeblock is the body of a function, executed in its own local scope.
+                New variables in the codeblock get added to this local scope.
             - "stay_local": no new local scope is added.
                 New variables in the codeblock get added to the current local scope.
-        """
-
-        if scope == "local":
-            # add new local scope to local_variables list
-            self.local_variables.append(parameters)
-
-        for code_line in code_block:
-            # iterate over every line of baeng code
-            try:
-                # try to interpret code line as operator
-                self.operators[code_line[0]](*code_line[1:], scope=scope)
-
-            except KeyError:
-                # if code line is no operator try to interpret as user_function
-                if code_line[0] in self.user_functions:
-                    # code line is a user_function
 
-                    new_parameters = self._evaluate_function_parameters(code_line, scope=scope)
+        Returns
+        -------
+        out : Callable[[], None]
+            Function executing the compiled code lines one after another
+        """
 
-                    for sample_position in range(len(self.IR.data)):
-                        # iterate over each sample
+        code_lines = [
+            self._compile(code_line, scope=scope) for code_line in code_block
+        ]
 
-                        # safe current sample_position in attributes
-                        self.SAMPLEPOS = sample_position
+        if len(code_lines) == 1:
+            # blocks with a single line (e.g. bodies of if and while) run it directly
+            return code_lines[0]
 
-                        # execute user_function as code with given parameters as local variables
-                        self._interpret_codeblock(
-                            self.user_functions[code_line[0]]["CODE"],
-                            parameters=new_parameters,
-                            scope="local",
-                        )
-                else:
-                    # unknown command in current code line
-                    raise NotImplementedError()
+        def run_codeblock():
+            for code_line in code_lines:
+                # iterate over every line of baeng code
+                code_line()
 
-        if scope == "local":
-            # remove the added local scope from the local variables list
-            self.local_variables.pop(-1)
+        return run_codeblock
 
     def run(self):
         """
         Execute the given script
         """
 
-        self._interpret_codeblock(
-            self.script["CODE"], parameters=dict(), scope="global"
-        )
+        self.compiled_code()
 
         # export.wav at the end of code
         self.IR.export_wav_16bit(path=self.script["IR"][2])
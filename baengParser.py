@@ -5,6 +5,10 @@ import json
 import re
 
 
+# first characters of numeric literals besides digits and whitespace
+_NUMERIC_LEAD = frozenset("+-.")
+
+
 def try_number(s):
     """Return int/float if s is a numeric literal, otherwise None.
 
@@ -19,6 +23,11 @@ def try_number(s):
         Numeric contained in s as the correct type
     """
     try:
+        lead = s[:1]
+        if lead not in _NUMERIC_LEAD and not lead.isdigit() and not lead.isspace():
+            # e.g. identifiers, which would only raise in int()
+            return None
+
         if "." in s:
             return float(s)
         else:
@@ -27,6 +36,28 @@ def try_number(s):
         return None
 
 
+def _unquote(s):
+    """
+    Strip whitespace and surrounding quotes (single or double) from a string in one pass.
+
+    Parameters
+    ----------
+    s : str
+        String that may be enclosed in quotes
+
+    Returns
+    -------
+    out : str
+        String without surrounding whitespace and quotes
+    quoted : bool
+        True if the string was enclosed in matching quotes, False otherwise
+    """
+    s = s.strip()
+    if s[:1] in ('"', "'") and s[-1:] == s[:1]:
+        return s[1:-1], True
+    return s, False
+
+
 def is_quoted(s):
     """
     Check if a string is enclosed in quotes (either single or double).
@@ -41,8 +72,7 @@ def is_quoted(s):
     out : bool
         True if the string is enclosed in matching quotes, False otherwise
     """
-    s = s.strip()
-    return (s.startswith('"') and s.endswith('"')) or (s.startswith("'") and s.endswith("'"))
+    return _unquote(s)[1]
 
 
 def strip_quotes(s):
@@ -59,10 +89,7 @@ def strip_quotes(s):
     out : str
         String with surrounding quotes removed, or the original string if not quoted
     """
-    s = s.strip()
-    if is_quoted(s):
-        return s[1:-1]
-    return s
+    return _unquote(s)[0]
 
 
 def split_args_top_level(s):
@@ -80,26 +107,29 @@ def split_args_top_level(s):
     out : list[str]
         List of top-level arguments, stripped of surrounding whitespace
     """
+    if "(" not in s and ")" not in s:
+        # every comma is at the top level, split at once
+        args = [arg.strip() for arg in s.split(",")]
+        if args[-1] == "":
+            args.pop()
+        return args
+
     args = []
-    cur = ""
+    start = 0
     level = 0
-    i = 0
-    while i < len(s):
-        ch = s[i]
-        if ch == "(":
-            level += 1
-            cur += ch
-        elif ch == ")":
-            level -= 1
-            cur += ch
-        elif ch == "," and level == 0:
-            args.append(cur.strip())
-            cur = ""
-        else:
-            cur += ch
-        i += 1
-    if cur.strip() != "":
-        args.append(cur.strip())
+    previous = 0
+    comma = s.find(",")
+    while comma != -1:
+        # the parentheses are only counted up to each comma, instead of checking every char
+        level += s.count("(", previous, comma) - s.count(")", previous, comma)
+        if level == 0:
+            args.append(s[start:comma].strip())
+            start = comma + 1
+        previous = comma + 1
+        comma = s.find(",", previous)
+    last = s[start:].strip()
+    if last != "":
+        args.append(last)
     return args
 
 
@@ -121,6 +151,60 @@ into the function name (`readSample`) and its arguments (`SAMPLEPOS - i`).
 """
 
 
+_set_ir_re = re.compile(r"set IR:\s*\((.*)\)\s*$")
+"""
+Regular expression to match the IR definition `set IR: (fs, duration, "filename.wav")`,
+capturing the arguments inside the parentheses.
+"""
+
+
+_func_def_re = re.compile(r"func\s+([A-Za-z_]\w*)\s*\(\s*([A-Za-z0-9_,\s]*)\)\s*:\s*$")
+"""
+Regular expression to match a function definition `func name(arg1, arg2):`,
+capturing the function name and the comma-separated parameter names as separate groups.
+"""
+
+
+_atom_cache = {}
+"""
+Results of `parse_atom` for the stripped expressions already parsed, e.g. `SAMPLEPOS` or `0`,
+which repeat throughout a program. Only immutable results (numbers and strings) are cached,
+the lists of function calls are built again for every call site.
+The cache is cleared by `translate` for every new program.
+"""
+
+
+_line_re = re.compile(
+    r"(?P<ir>set IR:)"
+    r"|(?P<func>func )"
+    r"|(?P<if>if .*:$)"
+    r"|(?P<while>while .*:$)"
+    r"|(?P<print>print\(.*\)$)"
+    r"|(?P<export>export\(.*\)$)"
+    r"|(?P<setSample>setSample\(.*\)$)",
+    re.DOTALL,
+)
+"""
+Regular expression to classify a stripped code line by its statement in a single match,
+the name of the matching group (`m.lastgroup`) is the kind of statement.
+The alternatives are tried in order, so a line is classified by the first statement matching it:
+
+- `ir` for lines starting with `set IR:`.
+- `func` for lines starting with `func `.
+- `if` / `while` for lines starting with `if ` / `while ` and ending with `:`.
+- `print` / `export` / `setSample` for lines starting with the opening call and ending with `)`.
+
+Assignments and plain function calls are not matched and handled afterwards.
+"""
+
+
+_func_params_re = re.compile(r"[^,\s](?:[^,]*[^,\s])?")
+"""
+Regular expression to find the parameter names in the parameter list of a function definition,
+matching the text between commas without surrounding whitespace, skipping empty parameters.
+"""
+
+
 def parse_atom(expr):
     """
     Parse an atomic expression into a structured format suitable for JSON representation.
@@ -145,14 +229,21 @@ def parse_atom(expr):
     """
     e = expr.strip()
 
+    # already parsed?
+    if e in _atom_cache:
+        return _atom_cache[e]
+
     # numeric literal?
     num = try_number(e)
     if num is not None:
+        _atom_cache[e] = num
         return num
 
     # quoted string?
-    if is_quoted(e):
-        return strip_quotes(e)
+    unquoted, quoted = _unquote(e)
+    if quoted:
+        _atom_cache[e] = unquoted
+        return unquoted
 
     # simple function call?
     m = _simple_call_re.match(e)
@@ -175,6 +266,10 @@ def parse_atom(expr):
                 return [fname, parsed_args]
 
     # fallback: keep as raw string (for complex expressions or unknown functions)
+    if e.isidentifier():
+        # variable names share one string object with the names in the compiled expressions
+        e = sys.intern(e)
+    _atom_cache[e] = e
     return e
 
 
@@ -197,10 +292,11 @@ def parse_arg_list(s):
     return [parse_atom(p) for p in parts if p != ""]
 
 
-def parse_block(lines, i=0, indent=0):
+def parse_block(lines, i=0, indent=0, top=None):
     """
     Parse a block of indented code lines into a structured list of commands.
-    Recursively processes nested blocks based on indentation level.
+    Nested blocks are processed based on indentation level, keeping a stack of the open blocks,
+    so every line is only visited once.
 
     Parameters
     ----------
@@ -210,6 +306,10 @@ def parse_block(lines, i=0, indent=0):
         Starting line index (default: 0)
     indent : int, optional
         Current indentation level (default: 0)
+    top : dict, optional
+        Result dictionary of `translate`, receiving the IR and the user functions
+        defined in this block directly. If None, they are added to the code as
+        ("__IR__", ...) and ("__FUNC__", ...) markers (default: None)
 
     Returns
     -------
@@ -219,25 +319,36 @@ def parse_block(lines, i=0, indent=0):
         The index of the next line to process
     """
     code = []
+    # open blocks as (indentation level, list of commands), the innermost last
+    blocks = [(indent, code)]
     n = len(lines)
 
     while i < n:
         raw = lines[i]
+        line = raw.strip()
 
-        if raw.strip() == "":
+        if line == "":
             i += 1
             continue
         cur_indent = len(raw) - len(raw.lstrip(" "))
 
-        if cur_indent < indent:
-            # end of this block
-            return code, i
+        while cur_indent < blocks[-1][0]:
+            # end of the innermost block
+            blocks.pop()
 
-        line = raw.strip()
+            if not blocks:
+                # end of this block
+                return code, i
+
+        block_indent, block = blocks[-1]
+
+        # classify the statement of the line
+        m = _line_re.match(line)
+        kind = m.lastgroup if m else None
 
         # set IR: (fs, duration, "filename.wav")
-        if line.startswith("set IR:"):
-            m = re.match(r"set IR:\s*\((.*)\)\s*$", line)
+        if kind == "ir":
+            m = _set_ir_re.match(line)
 
             if not m:
                 raise ValueError(f"Malformed IR line: {raw}")
@@ -246,79 +357,89 @@ def parse_block(lines, i=0, indent=0):
             parsed = []
 
             for p in parts:
-                p = p.strip()
-                if is_quoted(p):
-                    parsed.append(strip_quotes(p))
+                p, quoted = _unquote(p)
+                if quoted:
+                    parsed.append(p)
                 else:
                     num = try_number(p)
                     if num is not None:
                         parsed.append(num)
                     else:
                         # fallback to string
-                        parsed.append(strip_quotes(p))
+                        parsed.append(p)
 
-            # IR is stored at top-level in final assemble step
-            code.append(("__IR__", parsed))
+            if top is not None and block is code:
+                # IR is stored at top-level of the result
+                top["IR"] = parsed
+            else:
+                block.append(("__IR__", parsed))
             i += 1
             continue
 
         # function definition: func name(arg1, arg2):
-        if line.startswith("func "):
-            m = re.match(r"func\s+([A-Za-z_]\w*)\s*\(\s*([A-Za-z0-9_,\s]*)\)\s*:\s*$", line)
+        if kind == "func":
+            m = _func_def_re.match(line)
 
             if not m:
                 raise ValueError(f"Malformed func def: {raw}")
 
-            fname = m.group(1)
-            params = [p.strip() for p in m.group(2).split(",") if p.strip()]
-            body, new_i = parse_block(lines, i + 1, indent + 4)
+            fname = sys.intern(m.group(1))
+            params = [sys.intern(p) for p in _func_params_re.findall(m.group(2))]
+            body = []
 
-            code.append(("__FUNC__", fname, params, body))
-            i = new_i
+            if top is not None and block is code:
+                # user functions are stored at top-level of the result
+                top[fname] = {
+                    "PARAMS": params,
+                    "CODE": body
+                }
+            else:
+                block.append(("__FUNC__", fname, params, body))
+            blocks.append((block_indent + 4, body))
+            i += 1
             continue
 
         # if / while
-        if line.startswith("if ") and line.endswith(":"):
+        if kind == "if":
             cond = line[len("if "):-1].strip()
-            body, new_i = parse_block(lines, i + 1, indent + 4)
-            code.append(["if", cond, body])
-            i = new_i
+            body = []
+            block.append(["if", cond, body])
+            blocks.append((block_indent + 4, body))
+            i += 1
             continue
 
-        if line.startswith("while ") and line.endswith(":"):
+        if kind == "while":
             cond = line[len("while "):-1].strip()
-            body, new_i = parse_block(lines, i + 1, indent + 4)
-            code.append(["while", cond, body])
-            i = new_i
+            body = []
+            block.append(["while", cond, body])
+            blocks.append((block_indent + 4, body))
+            i += 1
             continue
 
         # print(...)
-        if line.startswith("print(") and line.endswith(")"):
+        if kind == "print":
             inner = line[len("print("):-1].strip()
             # keep argument as-is (preserve quotes if present)
-            code.append(["print", inner])
+            block.append(["print", inner])
             i += 1
             continue
 
         # export(...)
-        if line.startswith("export(") and line.endswith(")"):
+        if kind == "export":
             inner = line[len("export("):-1].strip()
             # treat as string filename (strip quotes if provided)
-            if is_quoted(inner):
-                fname = strip_quotes(inner)
-            else:
-                fname = inner
-            code.append(["export", fname])
+            fname, _ = _unquote(inner)
+            block.append(["export", fname])
             i += 1
             continue
 
         # setSample(...) as statement
-        if line.startswith("setSample(") and line.endswith(")"):
+        if kind == "setSample":
             inner = line[len("setSample("):-1].strip()
             args = parse_arg_list(inner)
             # expected two args: pos and value
             # represent as ["setSample", arg1, arg2]
-            code.append(["setSample", args[0], args[1] if len(args) > 1 else None])
+            block.append(["setSample", args[0], args[1] if len(args) > 1 else None])
             i += 1
             continue
 
@@ -327,17 +448,17 @@ def parse_block(lines, i=0, indent=0):
         # assignment: a = expr
         if "=" in line and not line.startswith(("if ", "while ")):
             left, right = line.split("=", 1)
-            var = left.strip()
+            var = sys.intern(left.strip())
             rhs = right.strip()
             parsed_rhs = parse_atom(rhs)
-            code.append(["define", var, parsed_rhs])
+            block.append(["define", var, parsed_rhs])
             i += 1
             continue
 
         # plain function call like reflections(5)
         mcall = _simple_call_re.match(line)
         if mcall:
-            fname = mcall.group(1)
+            fname = sys.intern(mcall.group(1))
             arg_text = mcall.group(2).strip()
 
             if arg_text == "":
@@ -345,7 +466,7 @@ def parse_block(lines, i=0, indent=0):
             else:
                 args = parse_arg_list(arg_text)
 
-            code.append([fname, args])
+            block.append([fname, args])
             i += 1
             continue
 
@@ -378,30 +499,30 @@ def translate(source_text):
         - "CODE": list
             Main (top-level) code not belonging to IR or a function.
     """
-    lines = source_text.splitlines()
-    parsed, _ = parse_block(lines, 0, 0)
+    return translate_lines(source_text.splitlines())
 
-    result = {}
-    main_code = []
 
-    for item in parsed:
+def translate_lines(lines):
+    """
+    Parse source lines into an intermediate representation, functions, and main code.
+    Same as `translate`, for source code already split into lines, e.g. while reading a file.
 
-        # IR
-        if isinstance(item, tuple) and item[0] == "__IR__":
-            result["IR"] = item[1]
-            continue
+    Parameters
+    ----------
+    lines : list[str]
+        Lines of the source code, without line breaks.
 
-        # user function
-        if isinstance(item, tuple) and item[0] == "__FUNC__":
-            _, fname, params, body = item
-            result[fname] = {
-                "PARAMS": params,
-                "CODE": body
-            }
-            continue
+    Returns
+    -------
+    result : dict
+        Dictionary with the structure described in `translate`.
+    """
+    _atom_cache.clear()
 
-        # everything else is main code
-        main_code.append(item)
+    # IR and user functions are added to the result while parsing,
+    # everything else is main code
+    result = {}
+    main_code, _ = parse_block(lines, 0, 0, top=result)
 
     if "IR" not in result:
         result["IR"] = []
@@ -423,12 +544,15 @@ if __name__ == "__main__":
         raise SystemExit("File is not a .baeng")
 
     try:
+        # split the lines while reading, without holding a copy of the whole file
         with open(path, "rt") as fh:
-            content = fh.read()
+            lines = [line for raw in fh for line in raw.splitlines()]
 
-        program = translate(content)
+        program = translate_lines(lines)
 
-        print(json.dumps(program, indent=4))
+        # write the JSON in chunks, without building the whole string first
+        json.dump(program, sys.stdout, indent=4)
+        sys.stdout.write("\n")
 
     except FileNotFoundError:
         raise SystemExit(f"File not found: {path}")